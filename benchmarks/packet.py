@@ -0,0 +1,244 @@
+"""
+Synthetic owner packet: a PDF laid out like the AppFolio owner packets the
+validator reads, with made-up properties, tenants and amounts, for
+benchmarking without sharing real packets.
+
+    python benchmarks/packet.py packet.pdf --pages 1000
+    python benchmarks/packet.py packet.pdf --pages 10000 --seed 7 --fees fees.csv
+
+Each property gets a "Properties: <code> - <address>" header on every page,
+a Balance Sheet (ASSETS / LIABILITIES & CAPITAL), a Cash Flow block with
+management and other fees, a Rent Roll of 4 to 400 units spread over as many
+pages as it needs (with Deposit and Past Due columns and their totals) and
+0-3 invoice attachment pages. A cover page comes first and a late addendum
+for an earlier property last, as in real packets. Roughly one property in
+three has a deliberate mistake (deposits out of trust, wrong fee, unrecorded
+prepaid rent, an admin fee, negative late fees) so the failing paths get
+exercised too.
+
+The output has exactly --pages pages and is the same for the same --pages
+and --seed. --fees also writes a matching fee table CSV; a few properties
+are left out of it on purpose.
+"""
+import argparse
+import csv
+import random
+import sys
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792
+FONT_SIZE = 9
+ROW_HEIGHT = 14
+RENT_ROLL_ROWS_PER_PAGE = 40
+RENT_ROLL_COLUMNS = (("Unit", 40), ("Tenant", 80), ("Additional Tenants", 140), ("Status", 230),
+                     ("Rent", 280), ("Deposit", 330), ("Move-in", 390), ("Lease From", 440),
+                     ("Lease To", 490), ("Past Due", 555))
+STREETS = ("Main St", "Oak Ave", "Palm Dr", "Cedar Ln", "Mesa Rd", "Harbor Blvd", "Sunset Way", "Elm Ct")
+FIRST_NAMES = ("Ana", "Ben", "Carla", "Dev", "Eli", "Fatima", "Gus", "Hana", "Ivan", "Jo", "Kofi", "Lena")
+LAST_NAMES = ("Alvarez", "Brooks", "Chen", "Diaz", "Evans", "Fischer", "Garcia", "Huang", "Ito", "Jones")
+INVOICE_VENDORS = ("City Water & Sewer", "Bright Electric", "Green Lawn Care", "Ace Plumbing", "Pest Pros")
+
+
+def money(value):
+    return "{:,.2f}".format(value)
+
+
+def plan_properties(pages, rng):
+    """One dict per property, sized so that cover + properties + addendum is exactly `pages` pages."""
+    plans = []
+    remaining = pages - 2  # cover page and late addendum
+    while remaining > 0:
+        if remaining < 3 and plans:  # too few for another property: more attachments on the last one
+            plans[-1]["invoices"] += remaining
+            break
+        roll = rng.random()
+        units = rng.randint(4, 40) if roll < 0.6 else rng.randint(41, 160) if roll < 0.9 else rng.randint(161, 400)
+        invoices = rng.choice((0, 0, 1, 1, 1, 2, 3))
+        rent_roll_pages = -(-units // RENT_ROLL_ROWS_PER_PAGE)
+        if 2 + rent_roll_pages + invoices > remaining:
+            invoices = 0
+            rent_roll_pages = max(1, min(rent_roll_pages, remaining - 2))
+            units = min(units, rent_roll_pages * RENT_ROLL_ROWS_PER_PAGE)
+            units = max(units, (rent_roll_pages - 1) * RENT_ROLL_ROWS_PER_PAGE + 1)
+        index = len(plans)
+        plans.append({
+            "code": "P%05d" % index,
+            "address": "%d %s" % (100 + rng.randint(0, 9899), rng.choice(STREETS)),
+            "units": units,
+            "invoices": invoices,
+            "fee_percent": rng.choice((6.0, 7.0, 8.0, 8.0, 10.0)),
+            "mistake": rng.choice((None,) * 11 + ("deposits", "fee", "prepaid", "admin fee", "late fee")),
+        })
+        remaining -= 2 + rent_roll_pages + invoices
+    return plans
+
+
+class _Writer:
+    """
+    Text-only pages written as raw content streams sharing one Helvetica
+    font resource: page.insert_text() re-checks the font on every call and
+    is a few hundred times slower, which matters at 10,000 pages.
+    """
+
+    def __init__(self):
+        import fitz  # PyMuPDF
+        self.doc = fitz.open()
+        font_xref = self.doc.get_new_xref()
+        self.doc.update_object(font_xref, "<</Type/Font/Subtype/Type1/BaseFont/Helvetica/Encoding/WinAnsiEncoding>>")
+        self.resources_xref = self.doc.get_new_xref()
+        self.doc.update_object(self.resources_xref, "<</Font<</helv %d 0 R>>>>" % font_xref)
+
+    def page(self, items):
+        """One page with each (x, y, text) drawn with its baseline at y points from the top."""
+        ops = ["BT /helv %d Tf" % FONT_SIZE]
+        for x, y, text in items:
+            escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            ops.append("1 0 0 1 %g %g Tm (%s) Tj" % (x, PAGE_HEIGHT - y, escaped))
+        ops.append("ET")
+        page = self.doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        contents_xref = self.doc.get_new_xref()
+        self.doc.update_object(contents_xref, "<<>>")
+        self.doc.update_stream(contents_xref, "\n".join(ops).encode("latin-1"))
+        self.doc.xref_set_key(page.xref, "Resources", "%d 0 R" % self.resources_xref)
+        self.doc.xref_set_key(page.xref, "Contents", "%d 0 R" % contents_xref)
+
+
+def _rent_roll(plan, rng):
+    rows = []
+    deposits = past_due_negative = 0.0
+    for unit in range(plan["units"]):
+        vacant = rng.random() < 0.06
+        rent = 0.0 if vacant else rng.randrange(800, 3200, 25)
+        deposit = 0.0 if vacant else rng.choice((rent, 500.0, 1000.0))
+        past_due = 0.0 if vacant else rng.choice((0.0, 0.0, 0.0, 0.0, 75.0, -rent / 2, -rent, 1200.5))
+        deposits += deposit
+        if past_due < 0:
+            past_due_negative += past_due
+        if vacant:
+            rows.append(["%d-%s" % (unit // 20 + 1, unit % 20 + 1), "VACANT", "", "Vacant-Unrented",
+                         "", "", "", "", "", ""])
+            continue
+        year = rng.randint(2015, 2024)
+        tenant = "%s %s" % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES))
+        other = "%s %s" % (rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)) if rng.random() < 0.3 else ""
+        rows.append(["%d-%s" % (unit // 20 + 1, unit % 20 + 1), tenant, other,
+                     rng.choice(("Current", "Current", "Current", "Notice-Unrented", "Evict")),
+                     money(rent), money(deposit), "%02d/01/%d" % (rng.randint(1, 12), year),
+                     "%02d/01/%d" % (rng.randint(1, 12), year), "%02d/31/%d" % (rng.randint(1, 12), year + 1),
+                     money(past_due)])
+    return rows, deposits, past_due_negative
+
+
+def _write_property(writer, plan, rng):
+    header = (40, 40, "Properties: %s - %s" % (plan["code"], plan["address"]))
+    rows, deposits, past_due_negative = _rent_roll(plan, rng)
+    cash = round(rng.uniform(-500, 60000), 2)
+    prepaid = -past_due_negative if plan["mistake"] != "prepaid" else 0.0
+    # The deposit liabilities (in trust + held by owner) add up to the Rent Roll's deposit total.
+    held_by_owner = rng.choice((0.0, 0.0, 0.0, min(500.0, deposits)))
+    held_in_trust = deposits - held_by_owner
+    if plan["mistake"] == "deposits":
+        held_in_trust -= rng.randint(1, 9) * 100
+    fee_percent = plan["fee_percent"] + (1.0 if plan["mistake"] == "fee" else 0.0)
+    income = sum(float(r[4].replace(",", "")) for r in rows if r[4])
+    fee_dollar = round(max(100.0, income * fee_percent / 100), 2)
+
+    writer.page([header, (40, 70, "Balance Sheet"), (40, 90, "ASSETS"),
+                 (40, 110, "Cash in Bank - Operating"), (40, 122, money(cash)),
+                 (40, 140, "Security Deposit Bank Account"), (40, 152, money(held_in_trust)),
+                 (40, 170, "TOTAL ASSETS"), (40, 182, money(cash + held_in_trust)),
+                 (40, 202, "LIABILITIES & CAPITAL"),
+                 (40, 222, "Prepaid Rent Liability"), (40, 234, money(prepaid)),
+                 (40, 252, "Security Deposit ( held in trust account)"), (40, 264, money(held_in_trust)),
+                 (40, 282, "Security Deposit (held by owner)"), (40, 294, money(held_by_owner)),
+                 (40, 312, "Total Liabilities"), (40, 324, money(prepaid + held_in_trust))])
+
+    items = [header, (40, 70, "Cash Flow"), (40, 90, "Additional Cash GL Accounts:"),
+             (40, 110, "Management Fees"), (40, 122, money(fee_dollar)), (40, 134, money(fee_percent))]
+    y = 152
+    if plan["mistake"] == "admin fee":
+        items += [(40, y, "Admin Fee"), (40, y + 12, money(rng.choice((25.0, 50.0))))]
+        y += 30
+    if rng.random() < 0.4:  # wrapped label, as AppFolio prints it in narrow columns
+        late_fees = rng.choice((10.0, 50.0, 125.0)) * (-1 if plan["mistake"] == "late fee" else 1)
+        items += [(40, y, "Late Fee"), (40, y + 12, "Income"), (40, y + 24, money(late_fees))]
+        y += 42
+    if rng.random() < 0.2:
+        items += [(40, y, "Appfolio Application"), (40, y + 12, "Fees"), (40, y + 24, money(0.0))]
+        y += 42
+    items += [(40, y, "NOI - Net Operating"), (40, y + 12, "Income"), (40, y + 24, money(income - fee_dollar)),
+              (40, y + 42, "Actual Ending Cash"), (40, y + 54, money(cash))]
+    writer.page(items)
+
+    chunks = [rows[k:k + RENT_ROLL_ROWS_PER_PAGE] for k in range(0, len(rows), RENT_ROLL_ROWS_PER_PAGE)] or [[]]
+    for chunk_index, chunk in enumerate(chunks):
+        items = [header, (40, 60, "Rent Roll")]
+        y = 100
+        if chunk_index == 0:
+            items += [(x, y, title) for title, x in RENT_ROLL_COLUMNS]
+            y += ROW_HEIGHT
+        for row in chunk:
+            items += [(x, y, cell) for cell, (_, x) in zip(row, RENT_ROLL_COLUMNS) if cell]
+            y += ROW_HEIGHT
+        if chunk_index == len(chunks) - 1:
+            items += [(40, y, "Total"), (330, y, money(deposits)), (555, y, money(past_due_negative))]
+            y += ROW_HEIGHT
+            items += [(40, y, "Grand Total"), (330, y, money(deposits))]
+        writer.page(items)
+
+    for _ in range(plan["invoices"]):
+        items = [header, (40, 80, "Invoice"), (40, 100, rng.choice(INVOICE_VENDORS)),
+                 (40, 120, "Invoice # %d" % rng.randint(10000, 99999))]
+        y = 150
+        for _ in range(rng.randint(1, 12)):
+            items += [(40, y, "Service %d" % rng.randint(1, 99)), (400, y, money(rng.uniform(10, 900)))]
+            y += ROW_HEIGHT
+        items += [(40, y + 10, "Amount due"), (400, y + 10, money(-rng.uniform(10, 5000)))]
+        writer.page(items)
+
+
+def write_packet(path, pages, seed=1):
+    """Write a packet of exactly `pages` pages (at least 5) to path; returns the property plans."""
+    if pages < 5:
+        raise ValueError("a packet needs at least 5 pages")
+    rng = random.Random(seed)
+    plans = plan_properties(pages, rng)
+    writer = _Writer()
+    writer.page([(40, 80, "Owner Packet"), (40, 100, "Statement period: %02d/2024" % rng.randint(1, 12))])
+    for plan in plans:
+        _write_property(writer, plan, rng)
+    first = plans[0]
+    writer.page([(40, 40, "Properties: %s - %s" % (first["code"], first["address"])), (40, 80, "Late addendum"),
+                 (40, 100, "Owner distribution adjusted after statement close.")])
+    writer.doc.save(path, garbage=1, deflate=True)
+    writer.doc.close()
+    return plans
+
+
+def write_fee_table(path, plans, missing_every=25):
+    """Fee table CSV for the plans, leaving every missing_every-th property out."""
+    with open(path, "w", newline="") as f:
+        out = csv.writer(f)
+        out.writerow(["property_code", "fee_percent", "min_dollar_charge"])
+        for index, plan in enumerate(plans):
+            if missing_every and index % missing_every == missing_every - 1:
+                continue
+            out.writerow([plan["code"], plan["fee_percent"], 100])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("output", help="PDF to write")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fees", help="also write a matching fee table CSV here")
+    args = parser.parse_args()
+
+    plans = write_packet(args.output, args.pages, args.seed)
+    if args.fees:
+        write_fee_table(args.fees, plans)
+    print("wrote %s: %d pages, %d properties" % (args.output, args.pages, len(plans)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Phase benchmark: pages/sec and where the time goes when validating synthetic
+owner packets (see packet.py) of 100, 1,000 and 10,000 pages.
+
+    python benchmarks/phases.py                        # all sizes, compared with baseline.json
+    python benchmarks/phases.py --pages 100 1000 --runs 5
+    python benchmarks/phases.py --save-baseline        # record this machine's numbers
+    python benchmarks/phases.py --max-slowdown 1.25    # exit 1 if any size is >25% slower
+
+Packets and their fee tables are generated once into --cache-dir (named after
+the page count, seed and generator source, so editing packet.py makes new
+ones). Each run validates a packet in this process with one worker - a pool
+would hide the phase times in other processes - and without the result cache.
+Phase times are exclusive (a phase's time excludes the phases it calls) and
+come from wrapping the module functions each phase goes through:
+
+    reading       _read_page: PyMuPDF text, plus words on possible rent-roll pages
+    segmentation  _PropertySegmenter.feed: the "Properties:" header walk
+    line scans    _scan_property_lines: labels on every property's lines
+    rent roll     the rest of _extract_property_facts: locating the Rent Roll,
+                  WordTable and its Past Due / Deposit columns
+    fee lookup    validate_management_fee
+    checks        the rest of evaluate_property
+    other         opening the file, page store and bookkeeping
+
+The reported run is the median by total time. baseline.json holds the numbers
+last saved with --save-baseline; they are only comparable on the same machine.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+SIZES = (100, 1000, 10000)
+PHASES = ("reading", "segmentation", "line scans", "rent roll", "fee lookup", "checks", "other")
+
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+class PhaseTimer:
+    """Exclusive time per phase, gathered by wrapping functions (see wrap)."""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.stack = []  # time spent in nested wrapped calls, per open call
+
+    def wrap(self, phase, func):
+        def timed(*args, **kwargs):
+            self.stack.append(0.0)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                self.totals[phase] += elapsed - self.stack.pop()
+                if self.stack:
+                    self.stack[-1] += elapsed
+        return timed
+
+
+def packet_paths(cache_dir, pages, seed):
+    """(pdf, fee csv) for this size, generating them if this generator version hasn't yet."""
+    import packet
+    with open(packet.__file__, "rb") as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:8]
+    base = os.path.join(cache_dir, "packet-%d-%d-%s" % (pages, seed, version))
+    pdf_path, fees_path = base + ".pdf", base + ".csv"
+    if not (os.path.exists(pdf_path) and os.path.exists(fees_path)):
+        os.makedirs(cache_dir, exist_ok=True)
+        print("generating %d-page packet..." % pages, file=sys.stderr)
+        plans = packet.write_packet(pdf_path + ".tmp", pages, seed)
+        packet.write_fee_table(fees_path, plans)
+        os.replace(pdf_path + ".tmp", pdf_path)
+    return pdf_path, fees_path
+
+
+def timed_run(pc, pdf_path):
+    """One validation of pdf_path with the phase wrappers in place: (total seconds, phase totals, properties)."""
+    timer = PhaseTimer()
+    patches = [
+        (pc, "_read_page", timer.wrap("reading", pc._read_page)),
+        (pc._PropertySegmenter, "feed", timer.wrap("segmentation", pc._PropertySegmenter.feed)),
+        (pc, "_scan_property_lines", timer.wrap("line scans", pc._scan_property_lines)),
+        (pc, "_extract_property_facts", timer.wrap("rent roll", pc._extract_property_facts)),
+        (pc, "validate_management_fee", timer.wrap("fee lookup", pc.validate_management_fee)),
+        (pc, "evaluate_property", timer.wrap("checks", pc.evaluate_property)),
+    ]
+    originals = [(owner, name, getattr(owner, name)) for owner, name, _ in patches]
+    for owner, name, wrapper in patches:
+        setattr(owner, name, wrapper)
+    try:
+        started = time.perf_counter()
+        result = pc.parse_pdf(pdf_path, workers=1, timeout=0)
+        total = time.perf_counter() - started
+    finally:
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+    timer.totals["other"] = max(0.0, total - sum(timer.totals.values()))
+    return total, timer.totals, len(result["detailed_checks"])
+
+
+def measure(pc, pages, seed, runs, cache_dir):
+    pdf_path, fees_path = packet_paths(cache_dir, pages, seed)
+    if not pc.load_fees_from_path(fees_path):
+        raise RuntimeError(pc.FEES_FILE_ERROR)
+    samples = sorted((timed_run(pc, pdf_path) for _ in range(runs)), key=lambda sample: sample[0])
+    total, phases, properties = samples[len(samples) // 2]
+    return {
+        "pages": pages,
+        "properties": properties,
+        "seconds": round(total, 4),
+        "pages_per_sec": round(pages / total, 1),
+        "phases": {phase: round(seconds, 4) for phase, seconds in phases.items()},
+    }
+
+
+def print_table(results, baseline):
+    print("%7s %6s %9s %9s  %s  %s" % ("pages", "props", "seconds", "pages/s",
+                                       " ".join("%12s" % p for p in PHASES), "vs baseline"))
+    for entry in results:
+        shares = " ".join("%6.3fs %3.0f%%" % (entry["phases"][p], 100 * entry["phases"][p] / entry["seconds"])
+                          for p in PHASES)
+        before = baseline.get(str(entry["pages"])) if baseline else None
+        compared = "%.2fx" % (entry["pages_per_sec"] / before["pages_per_sec"]) if before else "-"
+        print("%7d %6d %9.3f %9.1f  %s  %s" % (entry["pages"], entry["properties"], entry["seconds"],
+                                               entry["pages_per_sec"], shares, compared))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cache-dir", default=os.path.join(tempfile.gettempdir(), "pdf_checker_bench"))
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to baseline.json")
+    parser.add_argument("--max-slowdown", type=float, default=None,
+                        help="fail if any size's pages/sec is this many times below the baseline")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON instead of a table")
+    args = parser.parse_args()
+
+    import pdf_checker as pc
+    import fitz  # PyMuPDF
+
+    baseline = None
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)["sizes"]
+
+    results = [measure(pc, pages, args.seed, args.runs, args.cache_dir) for pages in args.pages]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results, baseline)
+
+    if args.save_baseline:
+        sizes = dict(baseline or {})
+        sizes.update((str(entry["pages"]), entry) for entry in results)
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({
+                "recorded": time.strftime("%Y-%m-%d"),
+                "machine": "%s %s, %d CPUs" % (platform.system(), platform.machine(), os.cpu_count() or 1),
+                "python": platform.python_version(),
+                "pymupdf": fitz.VersionBind,
+                "seed": args.seed,
+                "sizes": dict(sorted(sizes.items(), key=lambda item: int(item[0]))),
+            }, f, indent=2)
+            f.write("\n")
+        print("saved %s" % os.path.relpath(BASELINE_PATH, REPO_ROOT))
+
+    failed = False
+    if args.max_slowdown is not None and baseline:
+        for entry in results:
+            before = baseline.get(str(entry["pages"]))
+            if before and entry["pages_per_sec"] * args.max_slowdown < before["pages_per_sec"]:
+                print("FAIL: %d pages at %.1f pages/s, baseline %.1f" % (entry["pages"], entry["pages_per_sec"],
+                                                                        before["pages_per_sec"]))
+                failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Startup benchmark: time from launching the validator to its server accepting
+connections.
+
+    python benchmarks/startup.py                      # run pdf_checker.py from source
+    python benchmarks/startup.py --runs 10 --budget 2.5
+    python benchmarks/startup.py -- dist/PDFPropertyValidator.exe
+
+Each run starts a fresh process with the browser suppressed, waits for the
+"open: http://127.0.0.1:<port>" line, confirms the port accepts a connection
+and stops the process. Prints min/median/max seconds; with --budget, exits 1
+when the median is over budget so CI can catch regressions. When run from
+source it also fails if pandas or PyMuPDF are imported at startup.
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+URL_PATTERN = re.compile(r"http://127\.0\.0\.1:(\d+)")
+HEAVY_MODULES = ("pandas", "fitz", "pymupdf", "openpyxl", "numpy")
+
+
+def time_to_listening(cmd, timeout):
+    env = dict(os.environ, PDF_VALIDATOR_NO_BROWSER="1", PYTHONUNBUFFERED="1")
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            env=env, cwd=REPO_ROOT, text=True)
+    try:
+        port = None
+        for line in proc.stdout:
+            match = URL_PATTERN.search(line)
+            if match:
+                port = int(match.group(1))
+                break
+            if time.perf_counter() - started > timeout:
+                break
+        if port is None:
+            raise RuntimeError("server never reported its address (exit code %s)" % proc.poll())
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return time.perf_counter() - started
+            except OSError:
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError("port %d never accepted a connection" % port)
+                time.sleep(0.005)
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def heavy_modules_at_import():
+    code = ("import sys; sys.path.insert(0, %r); import pdf_checker; "
+            "print(' '.join(m for m in %r if m in sys.modules))" % (REPO_ROOT, HEAVY_MODULES))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO_ROOT)
+    lines = out.stdout.strip().splitlines()
+    return lines[-1].split() if lines else []  # last line: libraries may print their own notices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="fail if the median startup time exceeds this many seconds")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("cmd", nargs="*", help="command to launch (default: this Python + pdf_checker.py)")
+    args = parser.parse_args()
+
+    from_source = not args.cmd
+    cmd = args.cmd or [sys.executable, os.path.join(REPO_ROOT, "pdf_checker.py")]
+
+    times = []
+    for _ in range(args.runs):
+        times.append(time_to_listening(cmd, args.timeout))
+    median = statistics.median(times)
+    print("startup to listening over %d runs: min %.3fs  median %.3fs  max %.3fs"
+          % (len(times), min(times), median, max(times)))
+
+    failed = False
+    if from_source:
+        heavy = heavy_modules_at_import()
+        if heavy:
+            print("FAIL: imported at startup: %s" % ", ".join(heavy))
+            failed = True
+    if args.budget is not None and median > args.budget:
+        print("FAIL: median %.3fs is over the %.3fs budget" % (median, args.budget))
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Shared fixtures. The app-data folder is pointed at a temporary directory
+before pdf_checker is imported, so the tests never read or write the fee
+file, result cache, uploads or jobs of a real installation.
+"""
+import collections
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+DATA_DIR = os.path.join(TESTS_DIR, "data")
+
+_APP_HOME = tempfile.mkdtemp(prefix="pdf_checker_tests_")
+os.environ["HOME"] = _APP_HOME  # macOS: ~/Library/Application Support
+os.environ["APPDATA"] = _APP_HOME
+os.environ["XDG_DATA_HOME"] = _APP_HOME
+os.environ.pop("PDF_VALIDATOR_JOB_STORE", None)
+
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+
+import pdf_checker  # noqa: E402
+import packet  # noqa: E402
+
+# The packet the baseline results in data/ were produced from, by the
+# validator as it was before parse_pdf was split into phases and pools.
+BASELINE_PAGES, BASELINE_SEED = 300, 1
+
+Packet = collections.namedtuple("Packet", "pdf fees")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_APP_HOME, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def pc():
+    return pdf_checker
+
+
+@pytest.fixture(scope="session")
+def baseline_packet(tmp_path_factory):
+    """The synthetic packet behind data/baseline_300_1.json, with its fee table."""
+    folder = tmp_path_factory.mktemp("packet")
+    pdf_path = str(folder / "packet.pdf")
+    fees_path = str(folder / "fees.csv")
+    plans = packet.write_packet(pdf_path, BASELINE_PAGES, BASELINE_SEED)
+    packet.write_fee_table(fees_path, plans)
+    return Packet(pdf_path, fees_path)
+
+
+@pytest.fixture(scope="session")
+def baseline_result():
+    with open(os.path.join(DATA_DIR, "baseline_%d_%d.json" % (BASELINE_PAGES, BASELINE_SEED))) as fh:
+        return json.load(fh)
+
+
+@pytest.fixture
+def fees(pc, baseline_packet, monkeypatch):
+    """The baseline packet's fee table, loaded; the previous table comes back afterwards."""
+    for name in ("PROPERTY_FEES", "PROPERTY_FEES_BY_CODE", "FEES_FILE_ERROR", "FEES_SOURCE_NAME",
+                 "FEES_FINGERPRINT", "FEES_LOADED_STAMP"):
+        monkeypatch.setattr(pc, name, getattr(pc, name))
+    assert pc.load_fees_from_path(baseline_packet.fees)
+    return baseline_packet.fees
+
+
+@pytest.fixture
+def config(pc, monkeypatch):
+    """Set CONFIG entries for one test: config(WORKERS=1, ...)."""
+    def set_config(**values):
+        for key, value in values.items():
+            monkeypatch.setitem(pc.CONFIG, key, value)
+    return set_config
+
+
+@pytest.fixture
+def pdf_copy(baseline_packet, tmp_path):
+    """A fresh copy of the baseline packet for each call, since finished jobs delete their PDF."""
+    counter = iter(range(1000))
+
+    def copy():
+        path = str(tmp_path / ("upload-%d.pdf" % next(counter)))
+        shutil.copyfile(baseline_packet.pdf, path)
+        return path
+    return copy
+
+
+def wait_for(condition, timeout=60, interval=0.05):
+    """Poll condition() until it returns something truthy; fails the test after timeout seconds."""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = condition()
+        if value:
+            return value
+        if time.monotonic() > deadline:
+            pytest.fail("timed out waiting for %s" % getattr(condition, "__name__", "a condition"))
+        time.sleep(interval)
@@ -0,0 +1,81 @@
+"""
+The "check" command and the launcher's argument handling, each in a
+process of its own: the command takes over standard output, and the
+launcher starts a server.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import REPO_ROOT
+
+SCRIPT = os.path.join(REPO_ROOT, "pdf_checker.py")
+
+
+def run_check(*args, driver=None):
+    cmd = [sys.executable, driver or SCRIPT, "check"] + list(args)
+    return subprocess.run(cmd, capture_output=True, text=True, timeout=300, cwd=REPO_ROOT)
+
+
+def test_check_writes_every_property(baseline_packet, baseline_result):
+    done = run_check("--fees", baseline_packet.fees, "--no-cache", "--jobs", "1", baseline_packet.pdf)
+    assert done.returncode == 1, done.stderr  # the packet has failing properties
+    lines = [json.loads(line) for line in done.stdout.splitlines()]
+    assert [line["property"] for line in lines] == [p["property"] for p in baseline_result["detailed_checks"]]
+    failing = {entry["property"]: entry["failed_checks"] for entry in baseline_result["failing_summary"]}
+    assert {line["property"]: line["failed_checks"] for line in lines if line["failed_checks"]} == failing
+    assert "Checked 1 files" in done.stderr
+
+
+def test_check_reports_files_it_could_not_read(baseline_packet, tmp_path):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"%PDF-1.7 not really")
+    done = run_check("--fees", baseline_packet.fees, "--no-cache", str(broken))
+    assert done.returncode == 2
+    assert json.loads(done.stdout)["error"]
+
+
+def test_check_exits_3_when_properties_were_not_checked(baseline_packet, tmp_path):
+    # The files are checked on threads here, with a parse_pdf whose time
+    # limit always runs out, so the patch reaches every file.
+    driver = tmp_path / "driver.py"
+    driver.write_text(
+        "import multiprocessing.pool, sys, types\n"
+        "sys.path.insert(0, %r)\n"
+        "import pdf_checker as pc\n"
+        "parse_pdf = pc.parse_pdf\n"
+        "def timed_out(path, **kwargs):\n"
+        "    result = parse_pdf(path, **kwargs)\n"
+        "    facts = result['property_facts'][:-1] + [dict(code='P', address='A', not_checked=True)]\n"
+        "    return dict(pc.evaluate_properties(facts), time_limit={})\n"
+        "pc.parse_pdf = timed_out\n"
+        "pc.multiprocessing.get_context = lambda method: types.SimpleNamespace(\n"
+        "    Pool=multiprocessing.pool.ThreadPool)\n"
+        "sys.exit(pc.run_cli(sys.argv[1:]))\n" % REPO_ROOT)
+    done = run_check("--fees", baseline_packet.fees, "--no-cache", baseline_packet.pdf, driver=str(driver))
+    assert done.returncode == 3, done.stderr
+    assert "1 not checked" in done.stderr
+
+
+def test_unrelated_arguments_start_the_server(tmp_path):
+    env = dict(os.environ, PDF_VALIDATOR_NO_BROWSER="1", PYTHONUNBUFFERED="1")
+    proc = subprocess.Popen([sys.executable, SCRIPT, "-psn_0_12345"], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True, env=env, cwd=str(tmp_path))
+    try:
+        deadline = time.monotonic() + 60
+        output = []
+        while time.monotonic() < deadline:
+            line = proc.stdout.readline()
+            if not line:
+                break
+            output.append(line)
+            if "open: http://127.0.0.1:" in line:
+                return
+        pytest.fail("the server did not start:\n" + "".join(output))
+    finally:
+        proc.kill()
+        proc.wait()
@@ -0,0 +1,79 @@
+"""
+Fee tables: reading CSV and workbooks, and the sidecar cache of parsed
+workbooks, which must never hand one file's fees to another.
+"""
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def parse_cache(pc, tmp_path, monkeypatch):
+    path = str(tmp_path / "cache" / "property_fees.parsed.json")
+    os.makedirs(os.path.dirname(path))
+    monkeypatch.setattr(pc, "FEES_PARSE_CACHE_PATH", path)
+    return path
+
+
+def write_file(path, data, mtime_ns=None):
+    with open(path, "wb") as fh:
+        fh.write(data)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+
+def an_hour_ago_ns():
+    return time.time_ns() - 3600 * 10 ** 9
+
+
+def test_csv_and_workbook_read_the_same(pc, baseline_packet, tmp_path, parse_cache):
+    import pandas as pd
+    csv_fees = pc._read_fees_csv(baseline_packet.fees)
+    workbook = str(tmp_path / "fees.xlsx")
+    pd.read_csv(baseline_packet.fees, dtype={"property_code": str}).to_excel(
+        workbook, sheet_name="Property Fees", index=False)
+    assert pc._read_fees_workbook(workbook) == csv_fees
+    assert os.path.exists(parse_cache)
+    assert pc._read_fees_workbook(workbook) == csv_fees  # now from the cache
+
+
+def test_parse_cache_serves_an_unchanged_file_without_hashing(pc, tmp_path, parse_cache, monkeypatch):
+    path = write_file(tmp_path / "a.xlsx", b"a" * 100, an_hour_ago_ns())
+    pc._write_fees_parse_cache(path, {"A": {}})
+    monkeypatch.setattr(pc, "_file_sha256", lambda p: pytest.fail("hashed a file with a trusted stamp"))
+    assert pc._read_fees_parse_cache(path) == {"A": {}}
+
+
+def test_parse_cache_ignores_another_file_with_the_same_size_and_mtime(pc, tmp_path, parse_cache):
+    stamp = an_hour_ago_ns()
+    first = write_file(tmp_path / "a.xlsx", b"a" * 100, stamp)
+    pc._write_fees_parse_cache(first, {"A": {}})
+    second = write_file(tmp_path / "b.xlsx", b"b" * 100, stamp)
+    assert pc._read_fees_parse_cache(second) is None
+    same_content = write_file(tmp_path / "copy.xlsx", b"a" * 100, stamp)
+    assert pc._read_fees_parse_cache(same_content) == {"A": {}}
+
+
+def test_parse_cache_hashes_a_file_modified_just_before_it_was_cached(pc, tmp_path, parse_cache):
+    # On a filesystem with 2-second timestamps an edit right after caching
+    # can keep the mtime; only the content tells.
+    path = write_file(tmp_path / "a.xlsx", b"a" * 100)
+    stamp = os.stat(path).st_mtime_ns
+    pc._write_fees_parse_cache(path, {"A": {}})
+    write_file(path, b"b" * 100, stamp)
+    assert pc._read_fees_parse_cache(path) is None
+
+
+def test_parse_cache_writes_leave_no_temp_files(pc, tmp_path, parse_cache):
+    path = write_file(tmp_path / "a.xlsx", b"a" * 100)
+    for _ in range(3):
+        pc._write_fees_parse_cache(path, {"A": {}})
+    assert os.listdir(os.path.dirname(parse_cache)) == [os.path.basename(parse_cache)]
+
+
+def test_parse_cache_warning_goes_to_stderr(pc, tmp_path, parse_cache, capsys):
+    pc._write_fees_parse_cache(str(tmp_path / "missing.xlsx"), {"A": {}})
+    out, err = capsys.readouterr()
+    assert out == "" and "could not write the fee cache" in err
@@ -0,0 +1,255 @@
+"""
+Both job stores through the JobStore interface: running jobs to the end,
+the concurrency limit and queue, cancelling, re-checking under a new fee
+table and the retention sweep.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from conftest import wait_for
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, pc, tmp_path):
+    if request.param == "memory":
+        return pc.MemoryJobStore(str(tmp_path / "jobs"))
+    store = pc.SqliteJobStore(str(tmp_path / "jobs.db"))
+    store.POLL_INTERVAL = 0.05
+    return store
+
+
+@pytest.fixture
+def gated_jobs(pc, monkeypatch):
+    """
+    Replaces _run_job with one that holds each job until its gate is opened
+    (gates[job_id].set()), so tests decide when jobs finish. Cancelled jobs
+    stop at once, as a real run does at its next page.
+    """
+    gates = {}
+    started = []
+
+    def run_job(store, job_id, pdf_path, cancel=None, profile=False):
+        gate = gates.setdefault(job_id, threading.Event())
+        started.append(job_id)
+        while not gate.wait(0.02):
+            if cancel is not None and cancel.is_set():
+                store.mark_cancelled(job_id)
+                return
+        store.finish(job_id, {"detailed_checks": [{"property": job_id, "results": []}], "failing_summary": []},
+                     [], refetch=False)
+        pc._remove_quietly(pdf_path)
+
+    monkeypatch.setattr(pc, "_run_job", run_job)
+    return gates, started
+
+
+def status_of(store, job_id):
+    return store.progress(job_id)["status"]
+
+
+def test_runs_a_job_to_the_end(pc, store, fees, pdf_copy, baseline_result):
+    pdf_path = pdf_copy()
+    store.submit("a" * 32, pdf_path)
+    store.start()
+    wait_for(lambda: status_of(store, "a" * 32) == "done")
+
+    status, result = store.result("a" * 32)
+    assert status == "done"
+    assert result["detailed_checks"] == baseline_result["detailed_checks"]
+    assert result["failing_summary"] == baseline_result["failing_summary"]
+    wait_for(lambda: not os.path.exists(pdf_path))  # removed right after the result is stored
+    assert store.counts() == {"done": 1}
+    assert store.cancel("a" * 32) is False
+
+    events = "".join(store.events("a" * 32))
+    assert "event: done" in events and '"refetch":true' in events
+
+
+def test_unknown_job(store):
+    assert store.progress("f" * 32) is None
+    assert store.result("f" * 32) is None
+    assert store.events("f" * 32) is None
+    assert store.cancel("f" * 32) is None
+
+
+def test_queue_respects_the_concurrency_limit(store, config, gated_jobs, pdf_copy):
+    gates, started = gated_jobs
+    config(MAX_CONCURRENT_JOBS=1)
+    store.start()
+    ids = ["%032x" % n for n in range(3)]
+    for job_id in ids:
+        store.submit(job_id, pdf_copy())
+
+    wait_for(lambda: started == ids[:1])
+    assert [store.progress(job_id)["queue_position"] for job_id in ids] == [0, 1, 2]
+    assert store.progress(ids[2])["message"] == "Waiting in line — position 2…"
+
+    gates[ids[0]].set()
+    wait_for(lambda: started == ids[:2])
+    assert status_of(store, ids[0]) == "done"
+    assert store.progress(ids[2])["queue_position"] == 1
+
+    for job_id in ids[1:]:
+        gates.setdefault(job_id, threading.Event()).set()
+    wait_for(lambda: all(status_of(store, job_id) == "done" for job_id in ids))
+    assert started == ids
+
+
+def test_a_profiled_job_waits_for_the_profiler_without_a_slot(pc, store, config, gated_jobs, pdf_copy):
+    gates, started = gated_jobs
+    config(MAX_CONCURRENT_JOBS=2)
+    store.start()
+    first, second, plain = "a1" * 16, "a2" * 16, "a3" * 16
+    store.submit(first, pdf_copy(), profile=True)
+    wait_for(lambda: started == [first])
+    store.submit(second, pdf_copy(), profile=True)
+    store.submit(plain, pdf_copy())
+
+    wait_for(lambda: started == [first, plain])  # the free slot went past the second profiled job
+    assert status_of(store, second) == "queued"
+    gates[plain].set()
+    wait_for(lambda: status_of(store, plain) == "done")
+    time.sleep(0.2)
+    assert started == [first, plain]
+
+    gates[first].set()
+    wait_for(lambda: started == [first, plain, second])
+    gates[second].set()
+    wait_for(lambda: status_of(store, second) == "done")
+    wait_for(lambda: not pc.PROFILE_LOCK.locked())
+
+
+def test_cancelling_a_queued_job(store, config, gated_jobs, pdf_copy):
+    gates, started = gated_jobs
+    config(MAX_CONCURRENT_JOBS=1)
+    store.start()
+    running, queued = "1" * 32, "2" * 32
+    store.submit(running, pdf_copy())
+    queued_pdf = pdf_copy()
+    store.submit(queued, queued_pdf)
+    wait_for(lambda: started == [running])
+
+    assert store.cancel(queued) is True
+    assert status_of(store, queued) == "cancelled"
+    assert not os.path.exists(queued_pdf)
+    assert store.result(queued) == ("cancelled", None)
+
+    gates[running].set()
+    wait_for(lambda: status_of(store, running) == "done")
+    time.sleep(0.2)
+    assert started == [running]  # the cancelled job never ran
+
+
+def test_cancelling_a_running_job(store, gated_jobs, pdf_copy):
+    gates, started = gated_jobs
+    store.start()
+    store.submit("3" * 32, pdf_copy())
+    wait_for(lambda: started)
+    assert store.cancel("3" * 32) is True
+    wait_for(lambda: status_of(store, "3" * 32) == "cancelled")
+    assert "event: cancelled" in "".join(store.events("3" * 32))
+
+
+def test_reevaluates_recent_jobs_under_a_new_fee_table(pc, store, fees, pdf_copy, tmp_path):
+    store.submit("4" * 32, pdf_copy())
+    store.start()
+    wait_for(lambda: status_of(store, "4" * 32) == "done")
+    before = store.result("4" * 32)[1]
+
+    # Every property's fee moves a point, so each management fee check fails.
+    changed = tmp_path / "changed.csv"
+    with open(fees) as src:
+        rows = src.read().splitlines()
+    changed.write_text("\n".join([rows[0]] + ["%s,%s,%s" % (code, float(pct) + 1, low)
+                                              for code, pct, low in (row.split(",") for row in rows[1:])]) + "\n")
+    assert pc.load_fees_from_path(str(changed))
+
+    assert store.reevaluate_recent(5) == ["4" * 32]
+    after = store.result("4" * 32)[1]
+    assert len(after["failing_summary"]) > len(before["failing_summary"])
+    assert [p["property"] for p in after["detailed_checks"]] == [p["property"] for p in before["detailed_checks"]]
+
+
+def test_sweep_forgets_jobs_past_retention(store, config, gated_jobs, pdf_copy):
+    gates, _ = gated_jobs
+    config(JOB_RETENTION_HOURS=1)
+    store.start()
+    gates["5" * 32] = threading.Event()
+    gates["5" * 32].set()
+    store.submit("5" * 32, pdf_copy())
+    wait_for(lambda: status_of(store, "5" * 32) == "done")
+
+    store.sweep()
+    assert status_of(store, "5" * 32) == "done"
+    store.sweep(now=time.time() + 2 * 3600)
+    assert store.progress("5" * 32) is None
+
+
+def test_memory_store_moves_old_results_to_disk(pc, config, gated_jobs, pdf_copy, tmp_path):
+    gates, _ = gated_jobs
+    config(JOBS_KEPT_IN_MEMORY=1)
+    store = pc.MemoryJobStore(str(tmp_path / "jobs"))
+    ids = ["%032x" % n for n in range(6, 9)]
+    for job_id in ids:
+        gates[job_id] = threading.Event()
+        gates[job_id].set()
+        store.submit(job_id, pdf_copy())
+        wait_for(lambda: status_of(store, job_id) == "done")
+    store.sweep()
+
+    assert sum(1 for j in store.jobs.values() if j["result"] is not None) == 1
+    assert len(os.listdir(str(tmp_path / "jobs"))) == 2
+    for job_id in ids:
+        assert store.result(job_id)[1]["detailed_checks"][0]["property"] == job_id
+
+
+def test_sqlite_store_is_shared_between_instances(pc, gated_jobs, pdf_copy, tmp_path):
+    gates, _ = gated_jobs
+    path = str(tmp_path / "shared.db")
+    web, worker = pc.SqliteJobStore(path), pc.SqliteJobStore(path)
+    gates["9" * 32] = threading.Event()
+    gates["9" * 32].set()
+    web.submit("9" * 32, pdf_copy())  # also starts web's runners; either instance may claim it
+    worker.start()
+    wait_for(lambda: status_of(worker, "9" * 32) == "done")
+    assert web.result("9" * 32) == worker.result("9" * 32)
+
+
+@pytest.mark.parametrize("cancel_requested, attempts, status", [(1, 1, "cancelled"), (0, 99, "error")])
+def test_sqlite_store_removes_the_pdf_of_an_abandoned_job(pc, pdf_copy, tmp_path, cancel_requested, attempts, status):
+    store = pc.SqliteJobStore(str(tmp_path / "jobs.db"))
+    pdf_path = pdf_copy()
+    with store._transaction() as db:  # left running by a process that has since stopped
+        db.execute("INSERT INTO jobs (id, status, message, pdf_path, created_at, owner, heartbeat, attempts, "
+                   "cancel_requested) VALUES (?, 'running', '', ?, ?, 'gone', ?, ?, ?)",
+                   ("b" * 32, pdf_path, time.time(), time.time() - 3600, attempts, cancel_requested))
+    assert store._claim() is None
+    assert status_of(store, "b" * 32) == status
+    assert not os.path.exists(pdf_path)
+
+
+def test_sqlite_store_adds_new_columns_to_an_old_file(pc, tmp_path):
+    path = str(tmp_path / "old.db")
+    db = sqlite3.connect(path)
+    db.executescript(pc._SQLITE_SCHEMA.replace("    timings TEXT,\n", "").replace(
+        ",\n    profile INTEGER NOT NULL DEFAULT 0\n", "\n"))
+    assert {row[1] for row in db.execute("PRAGMA table_info(jobs)")}.isdisjoint({"timings", "profile"})
+    db.close()
+
+    store = pc.SqliteJobStore(path)
+    columns = {row[1] for row in store._db().execute("PRAGMA table_info(jobs)")}
+    assert {"timings", "profile"} <= columns
+
+
+def test_an_incomplete_store_cannot_be_created(pc):
+    class NoResults(pc.MemoryJobStore):
+        result = pc.JobStore.result  # back to the abstract method
+
+    with pytest.raises(TypeError, match="result"):
+        NoResults("unused")
+    with pytest.raises(TypeError):
+        pc.JobStore()
@@ -0,0 +1,124 @@
+"""
+parse_pdf against the baseline: however the run is carried out (serial or
+pooled, streamed or phased, page text in memory or spilled), the checks
+must come out exactly as they did before it was reorganised.
+"""
+import threading
+
+import pytest
+
+
+@pytest.mark.parametrize("stream", [True, False], ids=["stream", "phased"])
+@pytest.mark.parametrize("workers", [1, 2], ids=["serial", "pool"])
+def test_matches_baseline(pc, baseline_packet, baseline_result, fees, config, workers, stream):
+    config(PARALLEL_MIN_PAGES=1, READ_CHUNK_PAGES=10)
+    result = pc.parse_pdf(baseline_packet.pdf, workers=workers, stream=stream, timeout=0)
+    assert result["detailed_checks"] == baseline_result["detailed_checks"]
+    assert result["failing_summary"] == baseline_result["failing_summary"]
+
+
+@pytest.mark.parametrize("workers", [1, 2], ids=["serial", "pool"])
+def test_matches_baseline_with_page_text_spilled(pc, baseline_packet, baseline_result, fees, config, workers):
+    config(PARALLEL_MIN_PAGES=1, PAGE_TEXT_MEMORY_MB=0.002)  # a couple of pages in memory at a time
+    result = pc.parse_pdf(baseline_packet.pdf, workers=workers, timeout=0)
+    assert result["detailed_checks"] == baseline_result["detailed_checks"]
+    assert result["failing_summary"] == baseline_result["failing_summary"]
+
+
+def test_evaluating_kept_facts_matches_baseline(pc, baseline_packet, baseline_result, fees):
+    facts = pc.parse_pdf(baseline_packet.pdf, workers=1, timeout=0)["property_facts"]
+    result = pc.evaluate_properties(facts)
+    assert result["detailed_checks"] == baseline_result["detailed_checks"]
+    assert result["failing_summary"] == baseline_result["failing_summary"]
+
+
+@pytest.mark.parametrize("workers", [1, 2], ids=["serial", "pool"])
+def test_streamed_properties_add_up_to_the_result(pc, baseline_packet, fees, config, workers):
+    config(PARALLEL_MIN_PAGES=1)
+    reported = {}
+
+    def result_cb(index, property_entry, failing_entry):
+        reported[index] = property_entry  # a re-validated property is reported again; the last one counts
+
+    result = pc.parse_pdf(baseline_packet.pdf, workers=workers, result_cb=result_cb, timeout=0)
+    assert [reported[i] for i in range(len(reported))] == result["detailed_checks"]
+
+
+def test_cancel_stops_the_run(pc, baseline_packet, fees):
+    cancel = threading.Event()
+
+    def progress_cb(phase, current, total):
+        if current >= 40:
+            cancel.set()
+
+    with pytest.raises(pc.JobCancelled):
+        pc.parse_pdf(baseline_packet.pdf, workers=1, progress_cb=progress_cb, cancel=cancel, timeout=0)
+
+
+def test_time_limit_keeps_validated_properties(pc, baseline_packet, baseline_result, fees, monkeypatch):
+    # The clock jumps past the limit while the 100th page is being read, so
+    # the run ends with the 99 pages before it.
+    read_page = pc._read_page
+    pages = []
+
+    def slow_read_page(doc, p_num):
+        pages.append(p_num)
+        if len(pages) == 100:
+            clock[0] += 10
+        return read_page(doc, p_num)
+
+    clock = [0.0]
+    real_monotonic = pc.time.monotonic
+    monkeypatch.setattr(pc, "_read_page", slow_read_page)
+    monkeypatch.setattr(pc.time, "monotonic", lambda: real_monotonic() + clock[0])
+
+    result = pc.parse_pdf(baseline_packet.pdf, workers=1, timeout=5)
+    limit = result["time_limit"]
+    assert limit["pages_read"] == 99 and limit["total_pages"] == 300
+    skipped = [p for p in result["detailed_checks"] if p["results"][0]["status"] == "SKIPPED"]
+    checked = [p for p in result["detailed_checks"] if p not in skipped]
+    assert checked and len(skipped) == result["not_checked"] > 0
+    expected = {p["property"]: p for p in baseline_result["detailed_checks"]}
+    for prop in checked:
+        assert prop == expected[prop["property"]]
+
+
+def test_phase_timings(pc, baseline_packet, fees):
+    result = pc.parse_pdf(baseline_packet.pdf, workers=1, timeout=0, timings=pc.PhaseTimings())
+    timings = result["timings"]
+    assert timings["counts"]["pages_loaded"] == 300
+    assert {"opening", "reading", "segmentation"} <= set(timings["phases"])
+    assert len(timings["slowest_properties"]) == pc.PhaseTimings.SLOWEST_PROPERTIES
+
+
+@pytest.mark.parametrize("stream", [True, False], ids=["stream", "phased"])
+def test_serial_run_reports_validation_progress(pc, baseline_packet, baseline_result, fees, stream):
+    calls = []
+    pc.parse_pdf(baseline_packet.pdf, workers=1, stream=stream, timeout=0,
+                 progress_cb=lambda phase, current, total: calls.append((phase, current, total)))
+    total = len(baseline_result["detailed_checks"])
+    phases = [phase for phase, _, _ in calls]
+    validating = [current for phase, current, _ in calls if phase == "validating"]
+    assert phases == sorted(phases, key=["reading", "validating"].index)  # reading first, then validating
+    assert validating == sorted(validating) and validating[-1] == total
+    assert all(t == total for phase, _, t in calls if phase == "validating")
+    assert [current for phase, current, _ in calls if phase == "reading"][-1] == 300
+    if not stream:
+        # Everything is validated after reading, so every property counts
+        # (streamed, all but the last are validated while reading).
+        assert validating == list(range(1, total + 1))
+
+
+def test_page_store_keeps_words_within_the_budget(pc):
+    store = pc.PageTextStore(budget_chars=10 * pc.PageTextStore.WORD_CHARS)
+    words = {p: (792.0, [(10.0, 20.0 + i, 30.0, 40.0 + i, "w%d" % i, 0, 0, i) for i in range(4)])
+             for p in range(50)}
+    for p in range(50):
+        store[p] = "page %d" % p
+        store.put_words(p, words[p])
+        assert store._hot_chars <= 10 * pc.PageTextStore.WORD_CHARS
+    assert len(store) == 50
+    assert [store[p] for p in range(50)] == ["page %d" % p for p in range(50)]
+    assert [store.pop_words(p) for p in range(50)] == [words[p] for p in range(50)]
+    assert store.pop_words(0) is None
+    store.close()
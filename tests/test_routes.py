@@ -0,0 +1,242 @@
+"""
+The HTTP API end to end through Flask's test client, with a fresh in-memory
+job store: /start, chunked /upload, /lookup, /batch, /profile and /metrics.
+"""
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+import zipfile
+
+import pytest
+
+from conftest import wait_for
+
+
+@pytest.fixture
+def client(pc, tmp_path, monkeypatch, fees):
+    monkeypatch.setattr(pc, "JOB_STORE", pc.MemoryJobStore(str(tmp_path / "jobs")))
+    pc.app.testing = True
+    return pc.app.test_client()
+
+
+def pdf_bytes(baseline_packet):
+    with open(baseline_packet.pdf, "rb") as fh:
+        return fh.read()
+
+
+def wait_until_finished(client, job_id):
+    def finished():
+        state = client.get("/progress/" + job_id).get_json()
+        return state if state["status"] in ("done", "error", "cancelled") else None
+
+    state = wait_for(finished)
+    assert state["status"] == "done", state
+    return state
+
+
+def start_job(client, baseline_packet, **form):
+    form["file"] = (io.BytesIO(pdf_bytes(baseline_packet)), "packet.pdf")
+    response = client.post("/start", data=form, content_type="multipart/form-data")
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["job_id"]
+
+
+def metric_values(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    values = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+
+def test_start_progress_result(client, baseline_packet, baseline_result):
+    job_id = start_job(client, baseline_packet)
+    state = wait_until_finished(client, job_id)
+    assert state["percent"] == 100
+
+    result = client.get("/result/" + job_id).get_json()
+    assert result["detailed_checks"] == baseline_result["detailed_checks"]
+    assert result["failing_summary"] == baseline_result["failing_summary"]
+    assert "event: done" in client.get("/events/" + job_id).get_data(as_text=True)
+    assert client.post("/cancel/" + job_id).status_code == 409
+
+
+def test_unknown_job_and_missing_fee_file(pc, client, baseline_packet, monkeypatch):
+    assert client.get("/progress/" + "0" * 32).status_code == 404
+    assert client.get("/result/" + "0" * 32).status_code == 404
+    assert client.post("/cancel/" + "0" * 32).status_code == 404
+    monkeypatch.setattr(pc, "FEES_FILE_ERROR", "No fee file loaded yet.")
+    response = client.post("/start", data={"file": (io.BytesIO(b"%PDF-"), "a.pdf")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 400
+
+
+def test_lookup_answers_a_known_pdf(client, baseline_packet, baseline_result):
+    wait_until_finished(client, start_job(client, baseline_packet))
+    sha256 = hashlib.sha256(pdf_bytes(baseline_packet)).hexdigest()
+
+    known = client.post("/lookup", json={"sha256": sha256}).get_json()
+    assert known["known"] is True and known["how"] == "cached"
+    assert known["result"]["failing_summary"] == baseline_result["failing_summary"]
+    assert client.get("/progress/" + known["job_id"]).get_json()["status"] == "done"
+
+    assert client.post("/lookup", json={"sha256": "0" * 64}).get_json() == {"known": False}
+    assert client.post("/lookup", json={"sha256": "nope"}).status_code == 400
+
+
+def test_chunked_upload(client, baseline_packet, baseline_result):
+    data = pdf_bytes(baseline_packet)
+    upload = client.post("/upload", json={"filename": "packet.pdf", "size": len(data)}).get_json()
+    upload_id = upload["upload_id"]
+    chunk = 64 * 1024
+    offsets = list(range(0, len(data), chunk))
+
+    # Out of order, and the last chunk held back until the early completion is refused.
+    for offset in reversed(offsets[:-1]):
+        status = client.put("/upload/%s?offset=%d" % (upload_id, offset), data=data[offset:offset + chunk])
+        assert status.status_code == 200
+    assert client.post("/upload/%s/complete" % upload_id).status_code == 409
+    state = client.get("/upload/" + upload_id).get_json()
+    assert state["received"] == [[0, offsets[-1]]] and not state["complete"]
+
+    client.put("/upload/%s?offset=%d" % (upload_id, offsets[-1]), data=data[offsets[-1]:])
+    assert client.get("/upload/" + upload_id).get_json()["complete"]
+    job_id = client.post("/upload/%s/complete" % upload_id).get_json()["job_id"]
+    wait_until_finished(client, job_id)
+    assert client.get("/result/" + job_id).get_json()["failing_summary"] == baseline_result["failing_summary"]
+    assert client.get("/upload/" + upload_id).status_code == 404
+
+
+def test_chunked_upload_rejects_bad_requests(client):
+    assert client.post("/upload", json={"filename": "notes.txt", "size": 10}).status_code == 400
+    assert client.post("/upload", json={"filename": "a.pdf", "size": 0}).status_code == 400
+    upload_id = client.post("/upload", json={"filename": "a.pdf", "size": 10}).get_json()["upload_id"]
+    assert client.put("/upload/%s?offset=8" % upload_id, data=b"1234").status_code == 416
+    client.put("/upload/%s?offset=0" % upload_id, data=b"0123456789")
+    assert client.post("/upload/%s/complete" % upload_id).status_code == 400  # not a PDF
+    assert client.delete("/upload/" + upload_id).get_json() == {"discarded": True}
+    assert client.get("/upload/" + upload_id).status_code == 404
+    assert client.get("/upload/not-an-id").status_code == 404
+
+
+def test_sweep_removes_uploads_left_behind(pc, client, config, monkeypatch, tmp_path):
+    config(UPLOAD_RETENTION_HOURS=1, JOB_RETENTION_HOURS=2)
+    monkeypatch.setattr(pc, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    os.makedirs(pc.UPLOAD_DIR)
+    two_hours_ago = time.time() - 2 * 3600 - 60
+    paths = {}
+    for name in ("orphan.pdf", "recent.pdf", "nostate.part", "active.part", "active.json"):
+        paths[name] = os.path.join(pc.UPLOAD_DIR, name)
+        with open(paths[name], "wb") as fh:
+            fh.write(b"%PDF-")
+    for name in ("orphan.pdf", "nostate.part"):
+        os.utime(paths[name], (two_hours_ago, two_hours_ago))
+
+    pc.sweep_uploads()
+    assert sorted(os.listdir(pc.UPLOAD_DIR)) == ["active.json", "active.part", "recent.pdf"]
+    assert metric_values(client)['pdf_validator_disk_bytes{dir="uploads"}'] == 3 * len(b"%PDF-")
+
+
+def test_batch_of_pdfs_and_zips(client, baseline_packet, baseline_result):
+    data = pdf_bytes(baseline_packet)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("march/packet.pdf", data)
+        zf.writestr("march/readme.txt", "not a PDF")
+    archive.seek(0)
+    response = client.post("/batch", data={"files": [(io.BytesIO(data), "one.pdf"), (archive, "month.zip")]},
+                           content_type="multipart/form-data")
+    batch_id = response.get_json()["batch_id"]
+
+    def finished():
+        progress = client.get("/batch/" + batch_id).get_json()
+        return progress if progress["status"] == "done" else None
+
+    progress = wait_for(finished)
+    assert [f["name"] for f in progress["files"]] == ["one.pdf", "month.zip/march/packet.pdf"]
+    assert progress["counts"] == {"done": 2}
+
+    merged = client.get("/batch/%s/result" % batch_id).get_json()
+    expected = len(baseline_result["failing_summary"])
+    assert [f["failing"] for f in merged["files"]] == [expected, expected]
+    assert [entry["file"] for entry in merged["failing_summary"]] == ["one.pdf"] * expected + \
+        ["month.zip/march/packet.pdf"] * expected
+    assert client.post("/batch/%s/cancel" % batch_id).get_json() == {"cancelled": 0}
+    assert client.get("/batch/" + "0" * 32).status_code == 404
+
+
+def test_profiled_job(client, baseline_packet):
+    job_id = start_job(client, baseline_packet, profile="1")
+    wait_until_finished(client, job_id)
+
+    summary = client.get("/profile/%s?top=5&sort=tottime" % job_id).get_json()
+    assert summary["sort"] == "tottime" and len(summary["functions"]) == 5
+    assert summary["total_calls"] > 0
+    assert summary["run"]["serial"] and summary["run"]["workers"] == 1
+    download = client.get("/profile/%s/download" % job_id)
+    assert download.status_code == 200 and download.data
+    assert client.get("/profile/%s?sort=bogus" % job_id).status_code == 400
+
+    plain = start_job(client, baseline_packet)
+    wait_until_finished(client, plain)
+    assert client.get("/profile/" + plain).status_code == 404
+
+
+def test_metrics(client, baseline_packet):
+    before = metric_values(client)
+    wait_until_finished(client, start_job(client, baseline_packet))
+    after = metric_values(client)
+
+    assert after["pdf_validator_jobs_started_total"] == before["pdf_validator_jobs_started_total"] + 1
+    assert after['pdf_validator_jobs_finished_total{status="done"}'] == \
+        before['pdf_validator_jobs_finished_total{status="done"}'] + 1
+    assert after['pdf_validator_jobs{status="done"}'] == 1
+    assert after["pdf_validator_job_duration_seconds_count"] == before["pdf_validator_job_duration_seconds_count"] + 1
+    assert after['pdf_validator_job_duration_seconds_bucket{le="+Inf"}'] == \
+        after["pdf_validator_job_duration_seconds_count"]
+    assert after["process_resident_memory_bytes"] > 0
+    assert 'pdf_validator_disk_bytes{dir="results"}' in after
+
+
+def test_metrics_count_pdfs_waiting_for_their_job(pc, client, baseline_packet, monkeypatch):
+    release = threading.Event()
+    waiting = []
+
+    def run_job(store, job_id, pdf_path, cancel=None, profile=False):
+        waiting.append(pdf_path)
+        release.wait(30)
+        pc._remove_quietly(pdf_path)
+        store.fail(job_id, "released")
+
+    monkeypatch.setattr(pc, "_run_job", run_job)
+    job_id = start_job(client, baseline_packet)
+    wait_for(lambda: waiting)
+    assert os.path.dirname(waiting[0]) == pc.UPLOAD_TEMP_DIR
+    assert metric_values(client)['pdf_validator_disk_bytes{dir="tmp"}'] == len(pdf_bytes(baseline_packet))
+    release.set()
+    wait_for(lambda: client.get("/progress/" + job_id).get_json()["status"] == "error")
+    assert metric_values(client)['pdf_validator_disk_bytes{dir="tmp"}'] == 0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows reads the working set from the Windows API")
+def test_metrics_fall_back_to_peak_memory(pc, client, monkeypatch):
+    def no_proc(*args, **kwargs):
+        raise OSError("no /proc here")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(pc, "open", no_proc, raising=False)
+        patched.setitem(sys.modules, "psutil", None)
+        rss, peak = pc._process_rss_bytes()
+    assert peak and rss > 1024 * 1024
+
+    monkeypatch.setattr(pc, "_process_rss_bytes", lambda: (rss, True))
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "# HELP process_resident_memory_bytes Peak resident memory" in text
+    assert "process_resident_memory_bytes %d" % rss in text